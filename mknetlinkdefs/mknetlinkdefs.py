@@ -13,19 +13,12 @@ To verify result against manually assembled defs file:
 
 """
 
-from contextlib import ExitStack
-from os import unlink
 from os.path import join
 from struct import calcsize
 from sys import argv, stdout
-from tempfile import mkstemp
-from typing import ContextManager, IO, List, Literal, Tuple, Type
-from typing import Literal as LiteralT
-from typing import Optional as OptionalT
-from types import TracebackType
+from typing import List
 from black import format_file_contents, Mode
-from pyparsing import *
-from re import match
+from re import compile as re_compile, DOTALL, MULTILINE
 
 INC = "/usr/include"
 
@@ -39,6 +32,7 @@ HEADERS = (
 
 # tcm_block_index is the only #define that aliases the element of a struct
 EXCLUDE = "(^__)|(^tcm_block_index$)"
+exclude_match = re_compile(EXCLUDE).match
 
 CCODE = (
     """#include <stdio.h>
@@ -60,83 +54,35 @@ int main(int const argc, char const * const argv[])
 )
 
 
-class mkstemp_n:
-    def __init__(self, count: int = 2) -> None:
-        self.temps = tuple(mkstemp() for _ in range(count))
-
-    def __enter__(self) -> Tuple[IO, ...]:
-        files: List[IO] = []
-        with ExitStack() as stk:
-            for fd, _ in self.temps:
-                files.append(
-                    stk.enter_context(open(fd, "r+", encoding="ascii"))
-                )
-                self.undo = stk.pop_all()
-        return tuple(files)
-
-    def __exit__(
-        self,
-        ecls: OptionalT[Type[BaseException]],
-        eobj: OptionalT[BaseException],
-        etrc: OptionalT[TracebackType],
-    ) -> LiteralT[False]:
-        with self.undo:
-            pass
-        for _, fn in self.temps:
-            try:
-                unlink(fn)
-            except OSError:
-                pass
-        return False
-
-
-# syntax we don't want to see in the final parse tree
-# LPAREN, RPAREN, LBRACE, RBRACE, EQ, COMMA = Suppress.using_each("(){}=,")
-identifier = pyparsing_common.identifier
-integer = pyparsing_common.integer
-c_style_comment = Combine(Regex(r"/\*(?:[^*]|\*(?!/))*") + "*/")
-CHAR, SHORT, INT, LONG = (Literal(x) for x in ("char", "short", "int", "long"))
-stdtype = CHAR ^ SHORT ^ INT ^ LONG
-LPAREN, RPAREN, LBRACE, RBRACE, LBRACKET, RBRACKET, EQ, COMMA, SEMICOLON = (
-    Suppress(x) for x in "(){}[]=,;"
-)
-arith_op = Word("+-*/", max=1)
-arith_elem = identifier ^ integer
-arith_expr = Group(arith_elem + (arith_op + arith_elem)[...])
-paren_expr = arith_expr ^ (LPAREN + arith_expr + RPAREN)
-enumValue = Group(identifier("name") + Optional(EQ + paren_expr("value")))
-enumList = Group(enumValue + (COMMA + enumValue)[...] + Optional(COMMA))
-enum = (
-    Suppress("enum")
-    + Optional(identifier("ename"))
-    + LBRACE
-    + enumList("names")
-    + RBRACE
-)
-enum.ignore(c_style_comment)
-
-typespec = Combine(
-    Group(Optional(Literal("unsigned")) + stdtype) ^ identifier,
-    adjacent=False,
-)
-struct_elem = Group(
-    typespec("typespec")
-    + identifier("name")
-    + Optional(LBRACKET + integer("dim") + RBRACKET)
-    + SEMICOLON
+# The patterns below accept the same subset of C as the pyparsing grammar
+# they replaced: enums whose values are simple arithmetic on identifiers
+# and decimal integers, and structs whose members are all plain scalars
+# or arrays of decimal dimension. Anything else is skipped as a whole.
+IDENT = r"[A-Za-z_]\w*"
+ARITH_ELEM = rf"(?:{IDENT}|\d+)"
+ARITH_EXPR = rf"{ARITH_ELEM}(?:\s*[-+*/]\s*{ARITH_ELEM})*"
+ENUM_VALUE = rf"({IDENT})(?:\s*=\s*(?:{ARITH_EXPR}|\(\s*{ARITH_EXPR}\s*\)))?"
+STRUCT_ELEM = (
+    rf"((?:unsigned\s+)?(?:char|short|int|long)|{IDENT})"
+    rf"\s+({IDENT})\s*(?:\[\s*(\d+)\s*\])?\s*;"
 )
-struct_elist = Group(struct_elem[...])
-struct = (
-    Suppress("struct")
-    + identifier("name")
-    + LBRACE
-    + struct_elist("elist")
-    + RBRACE
-)
-struct.ignore(c_style_comment)
 
-define = LineStart() + Suppress("#define") + identifier("name") + White()
-define.ignore(c_style_comment)
+comment_sub = re_compile(r"/\*.*?\*/", DOTALL).sub
+enum_finditer = re_compile(
+    rf"enum\s*(?:{IDENT})?\s*\{{\s*"
+    rf"({ENUM_VALUE}(?:\s*,\s*{ENUM_VALUE})*(?:\s*,)?)\s*\}}"
+).finditer
+enum_value_finditer = re_compile(ENUM_VALUE).finditer
+struct_finditer = re_compile(
+    rf"struct\s*({IDENT})\s*\{{\s*((?:{STRUCT_ELEM}\s*)*)\}}"
+).finditer
+struct_elem_finditer = re_compile(STRUCT_ELEM).finditer
+whitespace_sub = re_compile(r"\s+").sub
+
+# object-like macros only: the name must be followed by whitespace
+define_finditer = re_compile(
+    r"^#define\s+([A-Za-z_]\w*)\s", MULTILINE
+).finditer
 
 TDICT = {
     "__kernel_sa_family_t": ("H", 0),
@@ -183,38 +129,36 @@ if __name__ == "__main__":
     names = set()
     structs = {}
     for infn in HEADERS:
-        with mkstemp_n() as (defs, rest), open(join(INC, infn)) as inp:
-            line = ""
-            for rline in inp.readlines():
-                line += rline
-                if line.endswith("\\\n"):
-                    line = line.rstrip("\\\n")
-                    continue
+        with open(join(INC, infn)) as inp:
+            # join continuation lines, then split out the #define lines
+            defs_lines: List[str] = []
+            rest_lines: List[str] = []
+            for line in (
+                inp.read().replace("\\\n", "").splitlines(keepends=True)
+            ):
                 if line.startswith("#define"):
-                    defs.write(line)
-                else:
-                    rest.write(line)
-                line = ""
-            defs.seek(0)
-            rest.seek(0)
-            # find instances of defines ignoring other syntax
-            for item, start, stop in define.scanString(defs.read()):
-                if item.name:
-                    if match(EXCLUDE, item.name):
-                        continue
-                    names.add(item.name)
+                    defs_lines.append(line)
                 else:
-                    print("****************\n", item.dump())
-            # find instances of enums ignoring other syntax
-            for item, start, stop in enum.scanString(rest.read()):
-                for entry in item.names:
-                    if not entry.name.startswith("__"):
-                        names.add(entry.name)
-            rest.seek(0)
-            for item, start, stop in struct.scanString(rest.read()):
-                structs[item.name] = (
-                    (elem.name, elem.typespec, elem.dim) for elem in item.elist
+                    rest_lines.append(line)
+        defs = "".join(defs_lines)
+        # a comment separates tokens like whitespace does
+        rest = comment_sub(" ", "".join(rest_lines))
+        # find instances of defines ignoring other syntax
+        for match in define_finditer(defs):
+            if not exclude_match(match[1]):
+                names.add(match[1])
+        # find instances of enums ignoring other syntax
+        for match in enum_finditer(rest):
+            for entry in enum_value_finditer(match[1]):
+                if not entry[1].startswith("__"):
+                    names.add(entry[1])
+        for match in struct_finditer(rest):
+            structs[match[1]] = tuple(
+                (name, whitespace_sub("", typespec), dim or "")
+                for typespec, name, dim in (
+                    elem.groups() for elem in struct_elem_finditer(match[2])
                 )
+            )
 
     with open("mkdefs.c", "w") as out:
         for hdr in HEADERS:
@@ -226,8 +170,8 @@ if __name__ == "__main__":
 
     classfile = '""" Autogenerated file, do not edit! """\n\n'
     classfile += "# pylint: disable=too-many-lines\n\n"
-    classfile += "from struct import unpack\n"
-    classfile += "from typing import List\n"
+    classfile += "from struct import Struct\n"
+    classfile += "from typing import Any, Callable, List, Tuple\n"
     classfile += "from .datatypes import NllMsg, nlmsgerr"
     for clname, _elems in structs.items():
         elems = tuple(
@@ -236,7 +180,7 @@ if __name__ == "__main__":
         classfile += f"\n\nclass {clname}(NllMsg):\n"
         classfile += f'\t"""struct {clname}"""\n'
         classfile += (
-            '\t__slots__ = ("remainder", '
+            '\t__slots__ = ("_buf", '
             + ", ".join(f'"{nm}"' for nm, *_ in elems)
             + ")\n"
         )
@@ -247,7 +191,8 @@ if __name__ == "__main__":
         )
         classfile += f'\tPACKFMT = "{packfmt}"\n'
         classfile += f"\tSIZE = {calcsize(packfmt)}\n"
-        classfile += "\tremainder: bytes\n"
+        classfile += "\t_PACK = Struct(PACKFMT).pack\n"
+        classfile += "\t_UNPACK = Struct(PACKFMT).unpack_from\n"
         for name, fmtchar, dim in elems:
             typ = (
                 "bytes"
@@ -257,8 +202,12 @@ if __name__ == "__main__":
                 else "int"
             )
             classfile += f"\t{name}: {typ}  # {dim} {fmtchar}\n"
-        classfile += "\tdef from_bytes(self, inp: bytes) -> None:\n"
-        classfile += f"\t\t{lside} = unpack(self.PACKFMT, inp)\n"
+        # bind the unpacker as a default argument: a local lookup per call
+        classfile += (
+            "\tdef from_bytes(self, inp: bytes,"
+            " _unpack: Callable[..., Tuple[Any, ...]] = _UNPACK) -> None:\n"
+        )
+        classfile += f"\t\t{lside} = _unpack(inp)\n"
     with open(argv[1], "w") if len(argv) > 1 else stdout as cl_out:
         print(
             format_file_contents(
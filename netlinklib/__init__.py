@@ -1,19 +1,24 @@
 """ Netlink dump implementation replacement for pyroute2 """
 
 from errno import ENODEV
-from functools import partial, reduce
-from ipaddress import ip_address
+from functools import lru_cache, partial, reduce
+from ipaddress import IPv4Address, IPv6Address, ip_address
+from itertools import chain
+from operator import or_
 from socket import (
     AF_BRIDGE,
     AF_INET,
+    AF_INET6,
     AF_NETLINK,
     AF_UNSPEC,
     NETLINK_ROUTE,
     SOCK_NONBLOCK,
     SOCK_RAW,
+    inet_pton,
     socket,
 )
-from struct import pack
+from struct import Struct
+from sys import byteorder
 from typing import (
     Any,
     Callable,
@@ -41,6 +46,34 @@ from .datatypes import *
 from .defs import *  # pylint: disable=wildcard-import, unused-wildcard-import
 
 IFF_UP = 1
+# rtm_table of routes in tables above 255, the real id is in RTA_TABLE
+RT_TABLE_COMPAT = 252
+
+_pack_int = Struct("=i").pack
+
+# Parsers only need a few header fields as plain values, not an object
+_ifinfomsg_unpack_from = Struct(ifinfomsg.PACKFMT).unpack_from
+_ndmsg_unpack_from = Struct(ndmsg.PACKFMT).unpack_from
+_rtnexthop_pack = Struct(rtnexthop.PACKFMT).pack
+_rtmsg_pack = Struct(rtmsg.PACKFMT).pack
+# rtnexthop immediately followed by the rtattr header of its RTA_GATEWAY
+_rtnexthop_gw_pack = Struct(rtnexthop.PACKFMT + rtattr.PACKFMT[1:]).pack
+_rtnexthop_unpack_from = Struct(rtnexthop.PACKFMT).unpack_from
+# rtmsg without the trailing rtm_flags, which the route parser ignores
+_rtmsg_unpack_from = Struct(rtmsg.PACKFMT[:-1]).unpack_from
+
+
+@lru_cache(maxsize=256)  # gateways repeat a lot in batch installs
+def _packed_ip(address: Union[str, int, IPv4Address, IPv6Address]) -> bytes:
+    """Binary representation of an IPv4 or IPv6 address"""
+    if not isinstance(address, str):  # address object or int
+        return ip_address(address).packed
+    try:
+        return inet_pton(AF_INET6 if ":" in address else AF_INET, address)
+    except OSError as e:
+        raise ValueError(
+            f"{address!r} does not appear to be an IPv4 or IPv6 address"
+        ) from e
 
 
 def parse_rtalist_if_vrf(
@@ -52,49 +85,72 @@ def parse_rtalist_if_vrf(
     return accum
 
 
+_vrf_infodata_sel: RtaDesc = {
+    IFLA_VRF_TABLE: (to_int, "krt"),
+}
+
+_linkinfo_sel: RtaDesc = {
+    IFLA_INFO_KIND: (to_str, "kind"),
+    IFLA_INFO_DATA: (parse_rtalist_if_vrf, _vrf_infodata_sel),
+}
+
 _newlink_sel: RtaDesc = {
     IFLA_IFNAME: (to_str, "name"),
     IFLA_LINK: (to_int, "peer"),
     IFLA_MASTER: (to_int, "master"),
-    IFLA_LINKINFO: (
-        parse_rtalist,
-        {
-            IFLA_INFO_KIND: (to_str, "kind"),
-            IFLA_INFO_DATA: (
-                parse_rtalist_if_vrf,
-                {
-                    IFLA_VRF_TABLE: (to_int, "krt"),
-                },
-            ),
-        },
-    ),
+    IFLA_LINKINFO: (parse_rtalist, _linkinfo_sel),
 }
 
-_newlink_nameonly_sel: RtaDesc = {
-    IFLA_IFNAME: (to_str, "name"),
-}
 
-
-def newlink_parser(
-    nameonly: bool = False,
+def _make_newlink_parser(
+    selector: RtaDesc,
 ) -> Callable[[bytes], Dict[str, Union[str, int]]]:
-    selector = _newlink_nameonly_sel if nameonly else _newlink_sel
-
     def _newlink_parser(message: bytes) -> Dict[str, Union[str, int]]:
         """Parse NEW_LINK netlink message"""
-        ifi = ifinfomsg(message)
+        _, _, _, ifi_index, ifi_flags, _ = _ifinfomsg_unpack_from(message)
         return parse_rtalist(
             {
-                "ifindex": ifi.ifi_index,
-                "is_up": bool(ifi.ifi_flags & IFF_UP),
+                "ifindex": ifi_index,
+                "is_up": (ifi_flags & IFF_UP) != 0,
             },
-            ifi.remainder,
+            message[ifinfomsg.SIZE :],
             selector,
         )
 
     return _newlink_parser
 
 
+def _newlink_nameonly_parser(message: bytes) -> Dict[str, Union[str, int]]:
+    """Parse NEW_LINK netlink message, only up to the IFLA_IFNAME"""
+    _, _, _, ifi_index, ifi_flags, _ = _ifinfomsg_unpack_from(message)
+    accum: Dict[str, Union[str, int]] = {
+        "ifindex": ifi_index,
+        "is_up": (ifi_flags & IFF_UP) != 0,
+    }
+    # The kernel puts IFLA_IFNAME first, no need to walk the rest
+    name = find_rta(message[ifinfomsg.SIZE :], IFLA_IFNAME)
+    if name is not None:
+        to_str(accum, name, "name")
+    return accum
+
+
+_newlink_parsers = {
+    False: _make_newlink_parser(_newlink_sel),
+    True: _newlink_nameonly_parser,
+}
+
+
+def newlink_parser(
+    nameonly: bool = False,
+) -> Callable[[bytes], Dict[str, Union[str, int]]]:
+    """Return the (shared) NEW_LINK message parser"""
+    return _newlink_parsers[bool(nameonly)]
+
+
+# Link requests carry an all-zero header, filtering is done by attributes
+_IFINFOMSG_BYTES = ifinfomsg().bytes
+
+
 def nll_get_links(
     socket: Optional[socket] = None,  # pylint: disable=redefined-outer-name
     nameonly: bool = False,
@@ -103,7 +159,7 @@ def nll_get_links(
     return nll_get_dump(
         RTM_GETLINK,
         RTM_NEWLINK,
-        ifinfomsg().bytes,
+        _IFINFOMSG_BYTES,
         (),
         newlink_parser(nameonly),
         sk=socket,
@@ -113,6 +169,9 @@ def nll_get_links(
 ############################################################
 
 
+_nexthop_sel: RtaDesc = {RTA_GATEWAY: (to_ipaddr, "gateway")}
+
+
 def parse_nhlist(
     accum: Dict[str, Union[int, str, List[Dict[str, Union[int, str]]]]],
     data: bytes,
@@ -120,22 +179,24 @@ def parse_nhlist(
 ) -> Dict[str, Union[int, str, List[Dict[str, Union[int, str]]]]]:
     """Parse a sequence of "nexthop" records in the "MULTIPATH" RTA"""
     nhops: List[Dict[str, Union[int, str]]] = []
-    while len(data) >= 8:
-        nh = rtnexthop(data)
+    offset = 0
+    size = len(data)
+    while size - offset >= rtnexthop.SIZE:
+        rtnh_len, _, _, rtnh_ifindex = _rtnexthop_unpack_from(data, offset)
         nhops.append(
             parse_rtalist(
                 {
                     # "rtnh_flags": rtnh_flags,
                     # "rtnh_hops": rtnh_hops,
-                    "ifindex": nh.rtnh_ifindex,
+                    "ifindex": rtnh_ifindex,
                 },
-                data[8 : nh.rtnh_len],
-                {RTA_GATEWAY: (to_ipaddr, "gateway")},
+                data[offset + rtnexthop.SIZE : offset + rtnh_len],
+                _nexthop_sel,
             )
         )
-        data = data[nh.rtnh_len :]
-    if data:
-        raise NllError(f"Remaining nexhop data: {data.hex()}")
+        offset += rtnh_len
+    if offset < size:
+        raise NllError(f"Remaining nexhop data: {data[offset:].hex()}")
     accum[key] = nhops
     return accum
 
@@ -159,29 +220,54 @@ def newroute_parser(  # pylint: disable=too-many-locals
     table_set: Optional[Set[int]] = None,
 ) -> List[Dict[str, Union[str, int]]]:
     """Parse NEW_ROUTE message"""
-    rtm = rtmsg(message)
+    (
+        rtm_family,
+        rtm_dst_len,
+        _,
+        _,
+        rtm_table,
+        rtm_protocol,
+        rtm_scope,
+        rtm_type,
+    ) = _rtmsg_unpack_from(message)
     # do not run expensive parse_rtalist if we know that we don't want this
     if (
         # pylint: disable=too-many-boolean-expressions
-        (table_set is not None and rtm.rtm_table not in table_set)
-        or (table and rtm.rtm_table != table)
-        or (protocol and rtm.rtm_protocol != protocol)
-        or (scope and rtm.rtm_scope != scope)
-        or (type and rtm.rtm_type != type)
+        (
+            table_set is not None
+            and rtm_table not in table_set
+            and rtm_table != RT_TABLE_COMPAT
+        )
+        or (table and rtm_table != table and rtm_table != RT_TABLE_COMPAT)
+        or (protocol and rtm_protocol != protocol)
+        or (scope and rtm_scope != scope)
+        or (type and rtm_type != type)
     ):
         return []
+    if rtm_table == RT_TABLE_COMPAT and (table_set is not None or table):
+        # header only said "some big table", peek at the real one
+        rta_table = find_rta(message, RTA_TABLE, rtmsg.SIZE)
+        big_table = (
+            rtm_table
+            if rta_table is None
+            else int.from_bytes(rta_table, byteorder=byteorder)
+        )
+        if (table_set is not None and big_table not in table_set) or (
+            table and big_table != table
+        ):
+            return []
     m_rtalist: Dict[
         str, Union[str, int, List[Dict[str, Union[str, int]]]]
     ] = parse_rtalist(
         {
-            "family": rtm.rtm_family,
-            "dst_prefixlen": rtm.rtm_dst_len,
-            "table": rtm.rtm_table,
-            "type": rtm.rtm_type,
-            "protocol": rtm.rtm_protocol,
-            "scope": rtm.rtm_scope,
+            "family": rtm_family,
+            "dst_prefixlen": rtm_dst_len,
+            "table": rtm_table,
+            "type": rtm_type,
+            "protocol": rtm_protocol,
+            "scope": rtm_scope,
         },
-        rtm.remainder,
+        message[rtmsg.SIZE :],
         _newroute_sel,
     )
     multipath = cast(
@@ -195,6 +281,28 @@ def newroute_parser(  # pylint: disable=too-many-locals
     return [{**rtalist, **nhop} for nhop in multipath]
 
 
+@lru_cache(maxsize=32)
+def _rtmsg_dump_bytes(
+    family: int,
+    flags: Optional[int],
+    protocol: Optional[int],
+    type: Optional[int],  # pylint: disable=redefined-builtin
+) -> bytes:
+    """Dump request header, there are only a few distinct ones in use"""
+    return rtmsg(
+        **{
+            k: v
+            for k, v in (
+                ("rtm_family", family),
+                ("rtm_flags", flags),
+                ("rtm_protocol", protocol),
+                ("rtm_type", type),
+            )
+            if v is not None
+        }
+    ).bytes
+
+
 def nll_get_routes(
     socket: Optional[socket] = None,  # pylint: disable=redefined-outer-name
     family: int = AF_UNSPEC,
@@ -207,37 +315,24 @@ def nll_get_routes(
 ) -> Iterable[Dict[str, Union[str, int]]]:
     """Public function to get all routes"""
     # net/ipv4/fib_frontend.c:910
-    rtm_kw = {
-        k: v
-        for k, v in (
-            ("rtm_family", family),
-            ("rtm_flags", flags),
-            ("rtm_protocol", protocol),
-            ("rtm_type", type),
-        )
-        if v is not None
-    }
     # if table is not None and table <= 255:
     #     rtm_kw["rtm_table"] = table
-    rtm_nla = tuple(
-        (k, pack("=i", v))
-        for k, v in ((RTA_TABLE, table), (RTA_OIF, oif))
-        if v is not None
-    )
-    # print("rtm_kw", rtm_kw, "rtm_nla", rtm_nla)
-    return [
-        el
-        for subl in nll_get_dump(
+    rtm_nla: List[Tuple[int, bytes]] = []
+    if table is not None:
+        rtm_nla.append((RTA_TABLE, _pack_int(table)))
+    if oif is not None:
+        rtm_nla.append((RTA_OIF, _pack_int(oif)))
+    return chain.from_iterable(
+        nll_get_dump(
             RTM_GETROUTE,
             RTM_NEWROUTE,
-            rtmsg(**rtm_kw).bytes,
+            _rtmsg_dump_bytes(family, flags, protocol, type),
             rtm_nla,
             newroute_parser,
             sk=socket,
             **kwargs,
         )
-        for el in subl
-    ]
+    )
 
 
 ##############################################################
@@ -249,19 +344,25 @@ _newneigh_sel: RtaDesc = {
 
 
 def newneigh_parser(message: bytes) -> Dict[str, Union[str, int]]:
-    ndm = ndmsg(message)
+    _, _, _, ifindex, state, flags, typ = _ndmsg_unpack_from(message)
     return parse_rtalist(
         {
-            "ifindex": ndm.ndm_ifindex,
-            "state": ndm.ndm_state,
-            "flags": ndm.ndm_flags,
-            "type": ndm.ndm_type,
+            "ifindex": ifindex,
+            "state": state,
+            "flags": flags,
+            "type": typ,
         },
-        ndm.remainder,
+        message[ndmsg.SIZE :],
         _newneigh_sel,
     )
 
 
+@lru_cache(maxsize=8)
+def _ndmsg_dump_bytes(family: int) -> bytes:
+    """Dump request header for the address family"""
+    return ndmsg(ndm_family=family).bytes
+
+
 def nll_get_neigh(
     socket: Optional[socket] = None,  # pylint: disable=redefined-outer-name
     family: int = AF_BRIDGE,
@@ -271,7 +372,7 @@ def nll_get_neigh(
     return nll_get_dump(
         RTM_GETNEIGH,
         RTM_NEWNEIGH,
-        ndmsg(ndm_family=family).bytes,
+        _ndmsg_dump_bytes(family),
         (),
         newneigh_parser,
         sk=socket,
@@ -290,7 +391,7 @@ def nll_link_lookup(
         msg = nll_transact(
             RTM_GETLINK,
             RTM_NEWLINK,
-            ifinfomsg().bytes,
+            _IFINFOMSG_BYTES,
             ((IFLA_IFNAME, ifname.encode("ascii") + b"\0"),),
             sk=socket,
         )
@@ -298,12 +399,95 @@ def nll_link_lookup(
         if e.args[0] == -ENODEV:
             return None
         raise
-    return ifinfomsg(msg).ifi_index  # ignore rtattrs
+    _, _, _, ifi_index, _, _ = _ifinfomsg_unpack_from(msg)
+    return ifi_index  # ignore rtattrs
 
 
 ##############################################################
 
 
+def _pack_multipath(
+    # flags: int = 0,
+    # hops: int = 0,
+    ifindex: int = 0,
+    gateway: Optional[str] = None,
+) -> bytes:
+    """rtnexthop header followed by the nexthop's own attributes"""
+    if not gateway:
+        return _rtnexthop_pack(rtnexthop.SIZE, 0, 0, ifindex)
+    # Address is 4 or 16 bytes, so the RTA_GATEWAY needs no padding
+    addr = _packed_ip(gateway)
+    return (
+        _rtnexthop_gw_pack(
+            rtnexthop.SIZE + rtattr.SIZE + len(addr),
+            0,
+            0,
+            ifindex,
+            rtattr.SIZE + len(addr),
+            RTA_GATEWAY,
+        )
+        + addr
+    )
+
+
+def _route_request(
+    msg_type: int,
+    # rtmsg args
+    family: int = AF_INET,
+    dst_prefixlen: int = 0,
+    src_prefixlen: int = 0,
+    tos: int = 0,
+    table: int = 254,  # RT_TABLE_MAIN
+    protocol: int = RTPROT_BOOT,
+    scope: int = RT_SCOPE_LINK,
+    type: int = RTN_UNICAST,
+    # rta args
+    dst: Optional[str] = None,
+    ifindex: Optional[int] = None,
+    metric: Optional[int] = None,
+    gateway: Optional[str] = None,
+    multipath: Optional[Sequence[Dict[str, Union[int, str]]]] = None,
+) -> Tuple[int, bytes, List[Tuple[int, bytes]], int]:
+    """Request tuple as taken by `nll_transact_many`"""
+    attrs: List[Tuple[int, bytes]] = []
+    if table is not None:
+        attrs.append((RTA_TABLE, _pack_int(table)))
+    if dst is not None:
+        attrs.append((RTA_DST, _packed_ip(dst)))
+    if ifindex is not None:
+        attrs.append((RTA_OIF, _pack_int(ifindex)))
+    if metric is not None:
+        attrs.append((RTA_PRIORITY, _pack_int(metric)))
+    if gateway is not None:
+        attrs.append((RTA_GATEWAY, _packed_ip(gateway)))
+    if multipath is not None:
+        attrs.append(
+            (
+                RTA_MULTIPATH,
+                b"".join(
+                    _pack_multipath(**cast(Dict[str, Any], path))
+                    for path in multipath
+                ),
+            )
+        )
+    return (
+        msg_type,
+        _rtmsg_pack(
+            family,
+            dst_prefixlen,
+            src_prefixlen,
+            tos,
+            0,  # rtm_table, use full length rtattr instead
+            protocol,
+            scope,
+            type,
+            0,  # rtm_flags
+        ),
+        attrs,
+        NLM_F_CREATE,
+    )
+
+
 def _nll_route(
     msg_type: int,
     # rtmsg args
@@ -323,59 +507,24 @@ def _nll_route(
     socket: Optional[socket] = None,  # pylint: disable=redefined-outer-name
     multipath: Optional[Sequence[Dict[str, Union[int, str]]]] = None,
 ) -> None:
-    def pack_multipath(
-        # flags: int = 0,
-        # hops: int = 0,
-        ifindex: int = 0,
-        gateway: Optional[str] = None,
-    ) -> bytes:
-        gwattr = (
-            pack_attr(RTA_GATEWAY, ip_address(gateway).packed)
-            if gateway
-            else b""
-        )
-        size = 2 + 1 + 1 + 4 + len(gwattr)
-        return (
-            rtnexthop(
-                rtnh_len=size,
-                # rtnh_flags=flags,
-                # rtnh_hops=hops,
-                rtnh_ifindex=ifindex,
-            ).bytes
-            + gwattr
-        )
-
-    nll_transact(
-        msg_type,
+    _, rtgenmsg, attrs, nlm_flags = _route_request(
         msg_type,
-        rtmsg(
-            rtm_family=family,
-            rtm_dst_len=dst_prefixlen,
-            rtm_src_len=src_prefixlen,
-            rtm_tos=tos,
-            # rtm_table=table,  # use full length rtattr instead
-            rtm_protocol=protocol,
-            rtm_scope=scope,
-            rtm_type=type,
-        ).bytes,
-        tuple(
-            (opt, fmt(optval))
-            for opt, fmt, optval in (
-                (RTA_TABLE, lambda x: pack("=i", x), table),
-                (RTA_DST, lambda ip: ip_address(ip).packed, dst),
-                (RTA_OIF, lambda x: pack("=i", x), ifindex),
-                (RTA_PRIORITY, lambda x: pack("=i", x), metric),
-                (RTA_GATEWAY, lambda ip: ip_address(ip).packed, gateway),
-                (
-                    RTA_MULTIPATH,
-                    lambda x: b"".join(pack_multipath(**path) for path in x),
-                    multipath,
-                ),
-            )
-            if optval is not None
-        ),
-        sk=socket,
-        nlm_flags=NLM_F_CREATE,
+        family,
+        dst_prefixlen,
+        src_prefixlen,
+        tos,
+        table,
+        protocol,
+        scope,
+        type,
+        dst,
+        ifindex,
+        metric,
+        gateway,
+        multipath,
+    )
+    nll_transact(
+        msg_type, msg_type, rtgenmsg, attrs, sk=socket, nlm_flags=nlm_flags
     )
 
 
@@ -383,6 +532,44 @@ nll_route_add = partial(_nll_route, RTM_NEWROUTE)
 nll_route_del = partial(_nll_route, RTM_DELROUTE)
 
 
+def _route_requests(
+    msg_type: int, routes: Iterable[Dict[str, Any]]
+) -> Iterable[Tuple[int, bytes, List[Tuple[int, bytes]], int]]:
+    for num, route in enumerate(routes):
+        if "socket" in route:
+            raise TypeError(
+                f"route #{num}: `socket` cannot be given per route,"
+                " pass it to the batch function"
+            )
+        try:
+            request = _route_request(msg_type, **route)
+        except ValueError as e:
+            raise ValueError(f"route #{num}: {e}") from e
+        yield request
+
+
+def nll_route_add_many(
+    routes: Iterable[Dict[str, Any]],
+    socket: Optional[socket] = None,  # pylint: disable=redefined-outer-name
+) -> None:
+    """
+    Add routes given as dicts of `_nll_route` kwargs other than `socket`,
+    in batches, see `nll_transact_many`
+    """
+    nll_transact_many(_route_requests(RTM_NEWROUTE, routes), sk=socket)
+
+
+def nll_route_del_many(
+    routes: Iterable[Dict[str, Any]],
+    socket: Optional[socket] = None,  # pylint: disable=redefined-outer-name
+) -> None:
+    """
+    Delete routes given as dicts of `_nll_route` kwargs other than `socket`,
+    in batches, see `nll_transact_many`
+    """
+    nll_transact_many(_route_requests(RTM_DELROUTE, routes), sk=socket)
+
+
 ##############################################################
 
 
@@ -395,6 +582,8 @@ _SUPPORTED_GROUPS = {
     RTMGRP_LINK: (RTM_NEWLINK, RTM_DELLINK),
 }
 
+_ALL_GROUPS_MASK = reduce(or_, _SUPPORTED_GROUPS)
+
 
 _SUPPORTED_EVENTS: Dict[int, Callable[[bytes], Any]] = {
     # TODO: Add new parsers
@@ -418,20 +607,13 @@ def nll_make_event_listener(*groups: int, block=False) -> socket:
     Sockets created with `block=True` will produce an endless
     blocking iterator which yields events as they become ready.
     """
-    unsupported = set(groups) - set(_SUPPORTED_GROUPS)
+    unsupported = {grp for grp in groups if grp not in _SUPPORTED_GROUPS}
     if unsupported:
         raise NllError(f"Unsupported group(s) requested: {unsupported}")
     sock = socket(
         AF_NETLINK, SOCK_RAW | (0 if block else SOCK_NONBLOCK), NETLINK_ROUTE
     )
-    sock.bind(
-        (
-            0,
-            reduce(
-                lambda x, y: x | y, groups if groups else _SUPPORTED_GROUPS
-            ),
-        )
-    )
+    sock.bind((0, reduce(or_, groups) if groups else _ALL_GROUPS_MASK))
     return sock
 
 
@@ -1,31 +1,56 @@
-""" Manual test for netlinklib """
+"""
+Manual test for netlinklib
 
-from typing import Any, Literal
+Prints wall time of each dump. For a profile, either pass `--profile`
+(or set NETLINKLIB_PROFILE=1) to run under cProfile, which inflates the
+times, or use a sampling profiler: `py-spy record -- python -m netlinklib`
+"""
+
+from argparse import ArgumentParser
+from os import environ
+from typing import Any, Literal, Optional
 from cProfile import Profile
 from pstats import Stats
-from time import time
+from time import perf_counter_ns
 from . import nll_get_links, nll_get_routes, nll_get_neigh
 
 
 class profiling:
+    """Time the block, and profile it too if asked: profiler skews time"""
+
+    enabled = False
+
     def __init__(self, name: str) -> None:
         self.name = name
+        self.prof: Optional[Profile] = None
 
     def __enter__(self) -> None:
-        self.prof = Profile()
-        self.before = time()
-        self.prof.enable()
+        if self.enabled:
+            self.prof = Profile()
+        self.before = perf_counter_ns()
+        if self.prof is not None:
+            self.prof.enable()
 
     def __exit__(self, *_) -> Literal[False]:
-        after = time()
-        self.prof.create_stats()
-        Stats(self.prof).strip_dirs().sort_stats("time").print_stats(8)
-        self.prof.disable()
-        print("time used for", self.name, ":", after - self.before)
+        if self.prof is not None:
+            self.prof.disable()
+        after = perf_counter_ns()
+        if self.prof is not None:
+            self.prof.create_stats()
+            Stats(self.prof).strip_dirs().sort_stats("time").print_stats(8)
+        print("time used for", self.name, ":", after - self.before, "ns")
         return False
 
 
 if __name__ == "__main__":
+    aparser = ArgumentParser(description="Time netlinklib dumps")
+    aparser.add_argument(
+        "--profile",
+        action="store_true",
+        help="run the dumps under cProfile and print the top entries",
+    )
+    from_env = environ.get("NETLINKLIB_PROFILE", "") not in ("", "0")
+    profiling.enabled = aparser.parse_args().profile or from_env
     with profiling("nll_get_links"):
         links = list(nll_get_links())
     print("links", len(links))
@@ -1,21 +1,33 @@
 """ Netlink dump implementation core functions """
 
+from functools import lru_cache
+from itertools import count
 from os import getpid, strerror
-from socket import AF_NETLINK, NETLINK_ROUTE, SOCK_RAW, socket
-from struct import error as StructError
+from socket import (
+    AF_INET,
+    AF_INET6,
+    AF_NETLINK,
+    NETLINK_ROUTE,
+    SOCK_RAW,
+    inet_ntop,
+    socket,
+)
+from struct import error as StructError, Struct
 from sys import byteorder
 from typing import (
     Any,
     Callable,
+    cast,
     Dict,
     Iterable,
+    List,
     Optional,
     Sequence,
     Tuple,
     TypeVar,
     Union,
 )
-from ipaddress import IPv4Address, IPv6Address, ip_address
+from ipaddress import IPv6Address, ip_address
 
 from .datatypes import NllError, NllDumpInterrupted, RtaDesc
 from .defs import *  # pylint: disable=wildcard-import, unused-wildcard-import
@@ -24,8 +36,11 @@ from .classes import nlmsgerr, nlmsghdr, rtattr
 __all__ = (
     "nll_get_dump",
     "nll_handle_event",
+    "nll_make_socket",
     "nll_transact",
+    "nll_transact_many",
     "parse_rtalist",
+    "find_rta",
     "pack_attr",
     "to_str",
     "to_int",
@@ -35,6 +50,29 @@ __all__ = (
 
 SOL_NETLINK = 270
 
+# Request headers are packed straight from field values, in field order
+_nlmsghdr_pack_into = Struct(nlmsghdr.PACKFMT).pack_into
+_nlmsghdr_unpack_from = Struct(nlmsghdr.PACKFMT).unpack_from
+_rtattr_pack = Struct(rtattr.PACKFMT).pack
+_rtattr_unpack_from = Struct(rtattr.PACKFMT).unpack_from
+_nlmsgerr_unpack_from = Struct(nlmsgerr.PACKFMT).unpack_from
+
+# Requests sent in one datagram by nll_transact_many(). The kernel acks
+# each of them separately, and every ack takes a whole skb worth of the
+# receive buffer, so the number of requests in flight is limited too.
+_BATCH_BYTES = 16384
+_BATCH_MSGS = 64
+
+# Batched requests take their seq numbers from here, unique within the
+# process, so that stray acks on a reused socket can be told apart.
+# nll_get_dump() and nll_transact() keep using 1 and 0.
+_seqnos = count(2)
+
+
+def _next_seq() -> int:
+    seq = next(_seqnos) & 0xFFFFFFFF
+    return seq if seq > 1 else _next_seq()  # u32 wrapped around
+
 
 def _messages(sk: socket) -> Iterable[Tuple[int, int, int, int, bytes]]:
     """
@@ -50,18 +88,27 @@ def _messages(sk: socket) -> Iterable[Tuple[int, int, int, int, bytes]]:
             return
         if not buf:
             return
-        while buf:
-            mh = nlmsghdr(buf)
-            if mh.nlmsg_type == NLMSG_DONE:
+        offset = 0
+        size = len(buf)
+        while offset < size:
+            (
+                nlmsg_len,
+                nlmsg_type,
+                nlmsg_flags,
+                nlmsg_seq,
+                nlmsg_pid,
+            ) = _nlmsghdr_unpack_from(buf, offset)
+            if nlmsg_type == NLMSG_DONE:
                 return
-            buf = buf[mh.nlmsg_len :]
             yield (
-                mh.nlmsg_type,
-                mh.nlmsg_flags,
-                mh.nlmsg_seq,
-                mh.nlmsg_pid,
-                mh.remainder[: mh.nlmsg_len - nlmsghdr.SIZE],
+                nlmsg_type,
+                nlmsg_flags,
+                nlmsg_seq,
+                nlmsg_pid,
+                # memoryview slice, not a copy; parsers only need a buffer
+                cast(bytes, buf[offset + nlmsghdr.SIZE : offset + nlmsg_len]),
             )
+            offset += nlmsg_len
 
 
 Rtype = TypeVar("Rtype")
@@ -70,9 +117,25 @@ Rtype = TypeVar("Rtype")
 def pack_attr(tag: int, val: bytes) -> bytes:
     size = 2 + 2 + len(val)
     increment = (size + 4 - 1) & ~(4 - 1)
-    return (rtattr(rta_len=size, rta_type=tag).bytes + val).ljust(
-        increment, b"\0"
-    )
+    return (_rtattr_pack(size, tag) + val).ljust(increment, b"\0")
+
+
+def _pack_request(  # pylint: disable=too-many-arguments
+    typ: int,
+    flags: int,
+    seq: int,
+    pid: int,
+    rtgenmsg: bytes,
+    attrs: Sequence[Tuple[int, bytes]],
+) -> bytearray:
+    # Build the whole request in one buffer, and fill in the header
+    # when the size is known, instead of concatenating the parts.
+    req = bytearray(nlmsghdr.SIZE)
+    req += rtgenmsg
+    for tag, val in attrs:
+        req += pack_attr(tag, val)
+    _nlmsghdr_pack_into(req, 0, len(req), typ, flags, seq, pid)
+    return req
 
 
 def _nll_get_dump(  # pylint: disable=too-many-locals
@@ -90,17 +153,10 @@ def _nll_get_dump(  # pylint: disable=too-many-locals
     pid = getpid()
     seq = 1
     flags = NLM_F_REQUEST | NLM_F_DUMP
-    battrs = b"".join(pack_attr(k, v) for k, v in attrs)
-    size = nlmsghdr.SIZE + len(rtgenmsg) + len(battrs)
-    nlhdr = nlmsghdr(
-        nlmsg_len=size,
-        nlmsg_type=typ,
-        nlmsg_flags=flags,
-        nlmsg_seq=seq,
-        nlmsg_pid=pid,
-    ).bytes
     try:
-        rc = s.sendto(nlhdr + rtgenmsg + battrs, (0, 0))
+        rc = s.sendto(
+            _pack_request(typ, flags, seq, pid, rtgenmsg, attrs), (0, 0)
+        )
     except OSError as e:
         raise NllError(e) from e
     if rc < 0:
@@ -121,6 +177,33 @@ def _nll_get_dump(  # pylint: disable=too-many-locals
         raise NllDumpInterrupted()  # raise this instead of StopIteration
 
 
+def nll_make_socket() -> socket:
+    """
+    Create a netlink socket to pass to the API functions as `socket`.
+    Reusing one socket saves creating a new one for every call.
+    Strict checking is enabled, so that the kernel does the filtering
+    requested by dump functions, like it does on their own sockets.
+    """
+    sk = socket(AF_NETLINK, SOCK_RAW, NETLINK_ROUTE)
+    sk.setsockopt(SOL_NETLINK, NETLINK_GET_STRICT_CHK, 1)
+    return sk
+
+
+def _nll_get_dump_owned(
+    typ: int,
+    rtyp: int,
+    rtgenmsg: bytes,
+    attrs: Sequence[Tuple[int, bytes]],
+    parser: Callable[[bytes], Rtype],
+    **kwargs: Any,
+) -> Iterable[Rtype]:
+    # Keeps the socket open for as long as the dump is being consumed
+    with nll_make_socket() as owns:
+        yield from _nll_get_dump(
+            owns, typ, rtyp, rtgenmsg, attrs, parser, **kwargs
+        )
+
+
 def nll_get_dump(
     typ: int,
     rtyp: int,
@@ -134,15 +217,10 @@ def nll_get_dump(
     Run netlink "dump" opeartion.
     """
     if sk is None:
-        with socket(AF_NETLINK, SOCK_RAW, NETLINK_ROUTE) as owns:
-            owns.setsockopt(SOL_NETLINK, NETLINK_GET_STRICT_CHK, 1)
-            yield from _nll_get_dump(
-                owns, typ, rtyp, rtgenmsg, attrs, parser, **kwargs
-            )
-    else:
-        yield from _nll_get_dump(
-            sk, typ, rtyp, rtgenmsg, attrs, parser, **kwargs
+        return _nll_get_dump_owned(
+            typ, rtyp, rtgenmsg, attrs, parser, **kwargs
         )
+    return _nll_get_dump(sk, typ, rtyp, rtgenmsg, attrs, parser, **kwargs)
 
 
 def _nll_transact(
@@ -159,17 +237,9 @@ def _nll_transact(
     pid = getpid()
     seq = 0
     flags = NLM_F_REQUEST | NLM_F_ACK | nlm_flags
-    battrs = b"".join(pack_attr(k, v) for k, v in attrs)
-    size = nlmsghdr.SIZE + len(rtgenmsg) + len(battrs)
-    nlhdr = nlmsghdr(
-        nlmsg_len=size,
-        nlmsg_type=typ,
-        nlmsg_flags=flags,
-        nlmsg_seq=seq,
-        nlmsg_pid=pid,
-    ).bytes
+    req = _pack_request(typ, flags, seq, pid, rtgenmsg, attrs)
     try:
-        rc = sk.sendto(nlhdr + rtgenmsg + battrs, (0, 0))
+        rc = sk.sendto(req, (0, 0))
     except OSError as e:
         raise NllError(e) from e
     try:
@@ -177,16 +247,43 @@ def _nll_transact(
     except OSError as e:
         raise NllError(e) from e
     mh = nlmsghdr(memoryview(buf))
+    if mh.nlmsg_type != NLMSG_ERROR:
+        # The reply is followed by the ack we asked for. Consume it, or on
+        # a reused socket it would be taken as the response to the next
+        # request. Do so before checking the reply.
+        _skip_to_ack(sk, memoryview(buf), mh.nlmsg_len)
     if mh.nlmsg_type == NLMSG_ERROR:
         emh = nlmsgerr(mh.remainder)
         if emh.error:
             raise NllError(
-                emh.error, f"{nlhdr!r} with {attrs}: {strerror(-emh.error)}"
+                emh.error,
+                f"{bytes(req[: nlmsghdr.SIZE])!r} with {attrs}:"
+                f" {strerror(-emh.error)}",
             )
         return b""  # "no error" response to state-modifying requests
     if mh.nlmsg_type != expect:
         raise NllError(f"Got {mh} instead of {expect}")
-    return mh.remainder
+    # only this message, the ack may have come in the same datagram
+    return cast(bytes, memoryview(buf)[nlmsghdr.SIZE : mh.nlmsg_len])
+
+
+def _skip_to_ack(sk: socket, buf: memoryview, offset: int) -> None:
+    # Read messages, starting at `offset` in `buf`, until the ack.
+    # It usually comes in a datagram of its own.
+    while True:
+        size = len(buf)
+        while offset < size:
+            nlmsg_len, nlmsg_type, _, _, _ = _nlmsghdr_unpack_from(buf, offset)
+            if nlmsg_type == NLMSG_ERROR:
+                return
+            if nlmsg_len < nlmsghdr.SIZE:
+                break  # malformed, drop the rest of the datagram
+            offset += nlmsg_len
+        try:
+            buf = memoryview(sk.recv(65536))
+        except OSError as e:
+            raise NllError(e) from e
+        offset = 0
 
 
 def nll_transact(
@@ -204,6 +301,102 @@ def nll_transact(
     return _nll_transact(sk, typ, expect, rtgenmsg, attrs, nlm_flags)
 
 
+def _nll_transact_batch(
+    sk: socket, batch: List[Tuple[int, int, bytearray]]
+) -> None:
+    # Send a batch of (number, seq, request) in one datagram, and wait for
+    # all acks before reporting an error. Seq numbers identify the
+    # requests, acks with other seq numbers are leftovers of earlier
+    # requests on a reused socket, and are skipped.
+    try:
+        sk.sendto(b"".join(req for _, _, req in batch), (0, 0))
+    except OSError as e:
+        raise NllError(e) from e
+    pending = {seq: num for num, seq, _ in batch}
+    failed: Optional[Tuple[int, int]] = None
+    while pending:
+        try:
+            buf = memoryview(sk.recv(65536))
+        except OSError as e:
+            raise NllError(e) from e
+        offset = 0
+        size = len(buf)
+        while offset < size:
+            nlmsg_len, nlmsg_type, _, nlmsg_seq, _ = _nlmsghdr_unpack_from(
+                buf, offset
+            )
+            offset += nlmsg_len
+            if nlmsg_type != NLMSG_ERROR:
+                continue
+            num = pending.pop(nlmsg_seq, None)
+            if num is None:
+                continue
+            (error,) = _nlmsgerr_unpack_from(
+                buf, offset - nlmsg_len + nlmsghdr.SIZE
+            )
+            if error and (failed is None or num < failed[0]):
+                failed = (num, error)
+    if failed is not None:
+        num, error = failed
+        raise NllError(error, f"request #{num}: {strerror(-error)}")
+
+
+def nll_transact_many(
+    requests: Iterable[Tuple[int, bytes, Sequence[Tuple[int, bytes]], int]],
+    sk: Optional[socket] = None,
+) -> None:
+    """
+    Send state-modifying requests, given as tuples of
+    (type, rtgenmsg, attrs, nlm_flags), several per datagram.
+    All requests are packed before the first one is sent, so an exception
+    while building them leaves everything unchanged.
+    Stop at the first batch that had an error, and raise NllError that
+    tells the (zero based) number of the first failed request.
+    Requests in the same batch, and in all earlier ones, were processed.
+    """
+    pid = getpid()
+    packed = []
+    for typ, rtgenmsg, attrs, nlm_flags in requests:
+        seq = _next_seq()
+        packed.append(
+            (
+                seq,
+                _pack_request(
+                    typ,
+                    NLM_F_REQUEST | NLM_F_ACK | nlm_flags,
+                    seq,
+                    pid,
+                    rtgenmsg,
+                    attrs,
+                ),
+            )
+        )
+    if sk is None:
+        with socket(AF_NETLINK, SOCK_RAW, NETLINK_ROUTE) as owns:
+            _nll_transact_packed(owns, packed)
+    else:
+        _nll_transact_packed(sk, packed)
+
+
+def _nll_transact_packed(
+    sk: socket, packed: List[Tuple[int, bytearray]]
+) -> None:
+    batch: List[Tuple[int, int, bytearray]] = []
+    batch_size = 0
+    for num, (seq, req) in enumerate(packed):
+        size = len(req)
+        if batch and (
+            batch_size + size > _BATCH_BYTES or len(batch) >= _BATCH_MSGS
+        ):
+            _nll_transact_batch(sk, batch)
+            batch = []
+            batch_size = 0
+        batch.append((num, seq, req))
+        batch_size += size
+    if batch:
+        _nll_transact_batch(sk, batch)
+
+
 def nll_handle_event(
     parsers: Dict[int, Callable[[bytes], Any]],
     sk: socket,
@@ -228,7 +421,7 @@ def to_str(
     accum: Dict[str, Union[int, str]], data: bytes, key: str
 ) -> Dict[str, Union[int, str]]:
     """Accumulating function that saves a string"""
-    accum[key] = bytes(data).rstrip(b"\0").decode("ascii")
+    accum[key] = str(data, "ascii").rstrip("\0")
     return accum
 
 
@@ -236,7 +429,7 @@ def to_mac(
     accum: Dict[str, Union[int, str]], data: bytes, key: str
 ) -> Dict[str, Union[int, str]]:
     """Accumulating function that saves a string"""
-    accum[key] = ":".join(f"{x:02x}" for x in data)
+    accum[key] = data.hex(":")
     return accum
 
 
@@ -248,42 +441,69 @@ def to_int(
     return accum
 
 
+_TEN_ZEROS = bytes(10)
+
+
+@lru_cache(maxsize=512)
+def _ipaddr_str(data: bytes) -> str:
+    """Text form of a binary address, the same few addresses repeat a lot"""
+    size = len(data)
+    if size == 4:
+        return inet_ntop(AF_INET, data)
+    if size == 16:
+        # glibc prints ::a.b.c.d and ::ffff:a.b.c.d forms in dotted quad,
+        # where ipaddress does not. Keep the ipaddress text for those.
+        if data[:10] == _TEN_ZEROS:
+            return str(IPv6Address(data))
+        return inet_ntop(AF_INET6, data)
+    # this is potentially less reliable, ints < 2**32 become IPv4
+    return str(ip_address(int.from_bytes(data, byteorder="big")))
+
+
 def to_ipaddr(
     accum: Dict[str, Union[int, str]], data: bytes, key: str
 ) -> Dict[str, Union[int, str]]:
     """Accumulating function that saves IP address in the form of s string"""
-    size = len(data)
-    address: Union[IPv4Address, IPv6Address]
-    if size == 4:
-        address = IPv4Address(int.from_bytes(data, byteorder="big"))
-    elif size == 16:
-        address = IPv6Address(int.from_bytes(data, byteorder="big"))
-    else:
-        # this is potentially less reliable, ints < 2**32 become IPv4
-        address = ip_address(int.from_bytes(data, byteorder="big"))
-    accum[key] = str(address)
+    # Key by a copy: a memoryview key would pin the whole receive buffer
+    accum[key] = _ipaddr_str(bytes(data))
     return accum
 
 
 def parse_rtalist(accum: Accum, data: bytes, sel: RtaDesc) -> Accum:
     """Walk over a chunk with collection of RTAs and collect RTAs"""
-    while data:
+    # Walk by offset: no rtattr object and no slice of the tail per RTA,
+    # only the payloads of the selected RTAs are sliced out.
+    offset = 0
+    size = len(data)
+    while offset < size:
         try:
-            rta = rtattr(data)
+            rta_len, rta_type = _rtattr_unpack_from(data, offset)
         except StructError as e:
             raise NllError(e) from e
-        # if rta.rta_len < 4:
-        #     raise NllError(f"rta_len {rta.rta_len} < 4: {data.hex()}")
-        increment = (rta.rta_len + 4 - 1) & ~(4 - 1)
-        # if len(data) < increment:
-        #     raise NllError(f"data len {len(data)} < {increment}: {data.hex()}")
-        data = data[increment:]
-        if rta.rta_type in sel:
-            op, *args = sel[rta.rta_type]
+        # if rta_len < 4:
+        #     raise NllError(f"rta_len {rta_len} < 4: {data.hex()}")
+        if rta_type in sel:
+            op, *args = sel[rta_type]
             accum = op(
-                accum, rta.remainder[: rta.rta_len - rtattr.SIZE], *args
+                accum, data[offset + rtattr.SIZE : offset + rta_len], *args
             )
+        offset += (rta_len + 4 - 1) & ~(4 - 1)
     return accum
 
 
+def find_rta(data: bytes, rta_type: int, offset: int = 0) -> Optional[bytes]:
+    """Payload of the first RTA of the given type at or after `offset`"""
+    # Stops at the match, useful when one early RTA is all that is needed
+    size = len(data)
+    while offset < size:
+        try:
+            rta_len, typ = _rtattr_unpack_from(data, offset)
+        except StructError as e:
+            raise NllError(e) from e
+        if typ == rta_type:
+            return data[offset + rtattr.SIZE : offset + rta_len]
+        offset += (rta_len + 4 - 1) & ~(4 - 1)
+    return None
+
+
 ############################################################
@@ -1,6 +1,7 @@
 """ Common datatypes for netlinklib moduels, including autogenerated code """
 
-from struct import pack, unpack
+import builtins
+from struct import Struct
 from typing import Any, Callable, ClassVar, Dict, get_type_hints, Tuple
 
 RtaDesc = Dict[int, Tuple[Callable[..., Any], Any]]
@@ -18,46 +19,60 @@ class NllDumpInterrupted(NllException):
     """ "Dump interrupted" condition reported by the kernel"""
 
 
+_FIELD_HINTS: Dict[type, Tuple[Tuple[str, Any], ...]] = {}
+
+
 class NllMsg:
     """Encoder / decoder for a `struct` used in netlink messages"""
 
     __slots__: ClassVar[Tuple[str]]
     PACKFMT: ClassVar[str]
     SIZE: ClassVar[int]
+    # builtins.bytes: in the class body, `bytes` is the property below
+    _PACK: ClassVar[Callable[..., builtins.bytes]]
+    _buf: builtins.bytes
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         try:  # Faster than checking for len(args), and this is a bottleneck
-            self.from_bytes(args[0][: self.SIZE])
-            self.remainder = args[0][self.SIZE :]
+            self._buf = args[0]
+            self.from_bytes(self._buf)
             return
         except IndexError:
             pass
-        hints = get_type_hints(self)
-        for attr in self.__slots__:
-            if attr == "remainder":
-                continue
+        for attr, hint in self._field_hints():
             try:
                 setattr(self, attr, kwargs[attr])
             except KeyError as e:
-                if hints[attr] is int:
+                if hint is int:
                     setattr(self, attr, 0)
                 else:
                     raise TypeError(
                         f"Missing non-integer kwarg {e.args[0]}"
-                        f" of type {hints[attr]}"
+                        f" of type {hint}"
                         f" for {self.__class__.__name__},"
                     ) from e
 
-    def __repr__(self) -> str:
-        return (
-            f"{self.__class__.__name__}("
-            + ", ".join(
-                f"{k}={repr(getattr(self, k))}"
-                for k in self.__slots__
-                if k != "remainder"
+    @classmethod
+    def _field_hints(cls) -> Tuple[Tuple[str, Any], ...]:
+        """Names and types of the fields, resolved once per class"""
+        try:
+            return _FIELD_HINTS[cls]
+        except KeyError:
+            hints = get_type_hints(cls)
+            return _FIELD_HINTS.setdefault(
+                cls,
+                tuple(
+                    (attr, hints[attr])
+                    for attr in cls.__slots__
+                    if attr != "_buf"
+                ),
             )
-            + ")"
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{k}={getattr(self, k)!r}" for k, _ in self._field_hints()
         )
+        return f"{self.__class__.__name__}({fields})"
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, NllMsg):
@@ -65,18 +80,20 @@ class NllMsg:
         return type(self) is type(other) and self.bytes == other.bytes
 
     def from_bytes(
-        self, inp: bytes
+        self, inp: builtins.bytes
     ) -> None:  # pylint: disable=unused-argument
-        """Parser for binary messages"""
+        """Parser for binary messages, `inp` may be longer than SIZE"""
+
+    @property
+    def remainder(self) -> builtins.bytes:
+        """Data following the struct in the parsed buffer"""
+        return self._buf[self.SIZE :]
 
     @property
     def bytes(self) -> bytes:
         """Represent message as bytes"""
-        return pack(
-            self.PACKFMT,
-            *tuple(
-                getattr(self, x) for x in self.__slots__ if x != "remainder"
-            ),
+        return self._PACK(
+            *tuple(getattr(self, x) for x, _ in self._field_hints())
         )
 
 
@@ -89,11 +106,14 @@ class NllMsg:
 class nlmsgerr(NllMsg):
     """The _header_ of struct nlmsgerr (not the whole struct)"""
 
-    __slots__ = ("error",)
+    __slots__ = ("_buf", "error")
     PACKFMT = "=i"
     SIZE = 4
-    remainder: bytes
+    _PACK = Struct(PACKFMT).pack
+    _UNPACK = Struct(PACKFMT).unpack_from
     error: int  #  i
 
-    def from_bytes(self, inp: bytes) -> None:
-        (self.error,) = unpack(self.PACKFMT, inp)
+    def from_bytes(
+        self, inp: bytes, _unpack: Callable[..., Tuple[Any, ...]] = _UNPACK
+    ) -> None:
+        (self.error,) = _unpack(inp)
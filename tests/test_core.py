@@ -0,0 +1,192 @@
+""" Unittest for netlinklib.core helpers that need no kernel """
+from collections import deque
+from errno import EEXIST
+from ipaddress import IPv6Address
+from struct import pack, unpack_from
+from typing import Deque, Dict, List, Tuple
+from unittest import TestCase
+
+from netlinklib.core import (
+    _BATCH_MSGS,
+    nll_transact,
+    nll_transact_many,
+    to_ipaddr,
+)
+from netlinklib.datatypes import NllError
+from netlinklib.defs import (
+    NLMSG_ERROR,
+    RTM_GETLINK,
+    RTM_NEWLINK,
+    RTM_NEWROUTE,
+)
+
+
+class IpaddrTest(TestCase):
+    """Text form of address RTAs"""
+
+    def test_ipv4(self):
+        self.assertEqual(
+            to_ipaddr({}, bytes((192, 0, 2, 1)), "a"), {"a": "192.0.2.1"}
+        )
+
+    def test_ipv6_same_as_ipaddress(self):
+        for addr in (
+            "::",
+            "::1",
+            "::1:2",
+            "::192.0.2.1",
+            "::ffff:192.0.2.1",
+            "::ffff:0:192.0.2.1",
+            "fe80::1",
+            "2001:db8::1:0:0:1",
+        ):
+            with self.subTest(addr=addr):
+                packed = IPv6Address(addr).packed
+                self.assertEqual(
+                    to_ipaddr({}, packed, "a"),
+                    {"a": str(IPv6Address(packed))},
+                )
+
+
+class FakeSocket:
+    """Acks every request it is sent, returns acks a few per datagram"""
+
+    def __init__(self, errors: Dict[int, int], acks_per_recv: int) -> None:
+        self.errors = errors  # number of request -> negative errno
+        self.acks_per_recv = acks_per_recv
+        self.received = 0
+        self.sent: List[List[int]] = []  # seq numbers of each datagram
+        self.acks: Deque[bytes] = deque()
+
+    def sendto(self, data: bytes, _: Tuple[int, int]) -> int:
+        seqs = []
+        offset = 0
+        while offset < len(data):
+            (size, _, _, seq, pid) = unpack_from("=LHHLL", data, offset)
+            seqs.append(seq)
+            self.ack(seq, pid, self.errors.get(self.received, 0))
+            self.received += 1
+            offset += size
+        self.sent.append(seqs)
+        return len(data)
+
+    def ack(self, seq: int, pid: int, error: int) -> None:
+        """Queue an ack, the header of the request is not checked"""
+        self.acks.append(  # nlmsghdr, error, header of the request
+            pack("=LHHLLi", 36, NLMSG_ERROR, 0, seq, pid, error) + bytes(16)
+        )
+
+    def recv(self, _: int) -> bytes:
+        if not self.acks:
+            raise AssertionError("recv() with no acks pending")
+        return b"".join(
+            self.acks.popleft()
+            for _ in range(min(self.acks_per_recv, len(self.acks)))
+        )
+
+
+def _requests(count: int) -> List[Tuple[int, bytes, Tuple[()], int]]:
+    return [(RTM_NEWROUTE, bytes(12), (), 0)] * count
+
+
+class TransactManyTest(TestCase):
+    """Batching of requests and accounting of their acks"""
+
+    def test_all_acked(self):
+        sk = FakeSocket({}, acks_per_recv=7)
+        nll_transact_many(_requests(2 * _BATCH_MSGS + 5), sk)  # type: ignore
+        self.assertEqual(
+            [len(seqs) for seqs in sk.sent],
+            [_BATCH_MSGS, _BATCH_MSGS, 5],
+        )
+        seqs = [seq for seqs in sk.sent for seq in seqs]
+        self.assertEqual(len(set(seqs)), len(seqs))
+        self.assertNotIn(0, seqs)
+        self.assertFalse(sk.acks)
+
+    def test_stale_acks_skipped(self):
+        sk = FakeSocket({}, acks_per_recv=3)
+        sk.ack(0, 0, -EEXIST)  # left over from nll_transact()
+        sk.ack(0, 0, 0)
+        nll_transact_many(_requests(5), sk)  # type: ignore
+        self.assertFalse(sk.acks)  # the last real ack was read too
+
+    def test_stale_ack_does_not_hide_error(self):
+        sk = FakeSocket({4: -EEXIST}, acks_per_recv=2)
+        sk.ack(0, 0, 0)
+        with self.assertRaises(NllError) as ctx:
+            nll_transact_many(_requests(5), sk)  # type: ignore
+        self.assertIn("request #4:", ctx.exception.args[1])
+        self.assertFalse(sk.acks)
+
+    def test_error_stops_after_batch(self):
+        failed = _BATCH_MSGS + 3
+        sk = FakeSocket({failed: -EEXIST, failed + 1: -EEXIST}, 10)
+        with self.assertRaises(NllError) as ctx:
+            nll_transact_many(_requests(3 * _BATCH_MSGS), sk)  # type: ignore
+        self.assertEqual(ctx.exception.args[0], -EEXIST)
+        self.assertIn(f"request #{failed}:", ctx.exception.args[1])
+        self.assertEqual(len(sk.sent), 2)  # third batch is not sent
+        self.assertFalse(sk.acks)  # all acks of the failed batch read
+
+    def test_bad_request_sends_nothing(self):
+        def requests():
+            yield from _requests(_BATCH_MSGS + 15)
+            raise ValueError("bad address")
+
+        sk = FakeSocket({}, 1)
+        with self.assertRaises(ValueError):
+            nll_transact_many(requests(), sk)  # type: ignore
+        self.assertEqual(sk.sent, [])
+
+
+class ReplySocket:
+    """Answers a request with a reply of the given type and then an ack"""
+
+    def __init__(self, reply_type: int, bundled: bool) -> None:
+        self.reply_type = reply_type
+        self.bundled = bundled
+        self.datagrams: Deque[bytes] = deque()
+
+    def sendto(self, data: bytes, _: Tuple[int, int]) -> int:
+        (_, _, _, seq, pid) = unpack_from("=LHHLL", data)
+        reply = pack("=LHHLL", 20, self.reply_type, 0, seq, pid) + b"data"
+        ack = pack("=LHHLLi", 36, NLMSG_ERROR, 0, seq, pid, 0) + data[:16]
+        if self.bundled:
+            self.datagrams.append(reply + ack)
+        else:
+            self.datagrams.extend((reply, ack))
+        return len(data)
+
+    def recv(self, _: int) -> bytes:
+        if not self.datagrams:
+            raise AssertionError("recv() with nothing pending")
+        return self.datagrams.popleft()
+
+
+class TransactTest(TestCase):
+    """The ack that follows a reply is always consumed"""
+
+    def test_expected_reply(self):
+        for bundled in (False, True):
+            with self.subTest(bundled=bundled):
+                sk = ReplySocket(RTM_NEWLINK, bundled)
+                reply = nll_transact(
+                    RTM_GETLINK, RTM_NEWLINK, bytes(16), (), sk  # type: ignore
+                )
+                self.assertEqual(bytes(reply), b"data")
+                self.assertFalse(sk.datagrams)
+
+    def test_unexpected_reply(self):
+        for bundled in (False, True):
+            with self.subTest(bundled=bundled):
+                sk = ReplySocket(RTM_NEWROUTE, bundled)
+                with self.assertRaises(NllError):
+                    nll_transact(
+                        RTM_GETLINK,
+                        RTM_NEWLINK,
+                        bytes(16),
+                        (),
+                        sk,  # type: ignore
+                    )
+                self.assertFalse(sk.datagrams)
@@ -0,0 +1,115 @@
+""" Unittest for route request building and parsing, without a kernel """
+from ipaddress import IPv4Address, IPv6Address
+from socket import AF_INET
+from struct import pack
+from unittest import TestCase
+from unittest.mock import patch
+
+from netlinklib import (
+    _packed_ip,
+    newroute_parser,
+    nll_route_add_many,
+    pack_attr,
+    RT_TABLE_COMPAT,
+    RTA_DST,
+    RTA_TABLE,
+    RTN_UNICAST,
+    RTPROT_STATIC,
+    RT_SCOPE_UNIVERSE,
+)
+
+
+class PackedIpTest(TestCase):
+    """Addresses in route requests"""
+
+    def test_accepted_forms(self):
+        for addr, packed in (
+            ("192.0.2.1", b"\xc0\x00\x02\x01"),
+            (IPv4Address("192.0.2.1"), b"\xc0\x00\x02\x01"),
+            (0xC0000201, b"\xc0\x00\x02\x01"),
+            ("2001:db8::1", IPv6Address("2001:db8::1").packed),
+            (IPv6Address("2001:db8::1"), IPv6Address("2001:db8::1").packed),
+        ):
+            with self.subTest(addr=addr):
+                self.assertEqual(_packed_ip(addr), packed)
+
+    def test_invalid(self):
+        for addr in ("192.0.2", "not an address", 2**128):
+            with self.subTest(addr=addr):
+                with self.assertRaises(ValueError):
+                    _packed_ip(addr)
+
+
+def _newroute(rtm_table: int, table: int) -> bytes:
+    """RTM_NEWROUTE payload as the kernel sends it"""
+    return (
+        pack(
+            "=BBBBBBBBI",
+            AF_INET,
+            24,
+            0,
+            0,
+            rtm_table,
+            RTPROT_STATIC,
+            RT_SCOPE_UNIVERSE,
+            RTN_UNICAST,
+            0,
+        )
+        + pack_attr(RTA_TABLE, pack("=I", table))
+        + pack_attr(RTA_DST, bytes((198, 51, 100, 0)))
+    )
+
+
+class NewrouteTableFilterTest(TestCase):
+    """Filtering by table of routes in tables above 255"""
+
+    def test_big_table_accepted(self):
+        msg = _newroute(RT_TABLE_COMPAT, 1000)
+        for kwargs in ({}, {"table": 1000}, {"table_set": {1000, 254}}):
+            with self.subTest(**kwargs):
+                (route,) = newroute_parser(msg, **kwargs)
+                self.assertEqual(route["table"], 1000)
+                self.assertEqual(route["dst"], "198.51.100.0")
+
+    def test_big_table_rejected_without_parsing(self):
+        msg = _newroute(RT_TABLE_COMPAT, 1000)
+        with patch("netlinklib.parse_rtalist") as parse:
+            for kwargs in (
+                {"table": 1001},
+                {"table": RT_TABLE_COMPAT},
+                {"table_set": {254, RT_TABLE_COMPAT}},
+            ):
+                with self.subTest(**kwargs):
+                    self.assertEqual(newroute_parser(msg, **kwargs), [])
+            parse.assert_not_called()
+
+    def test_table_compat_itself(self):
+        msg = _newroute(RT_TABLE_COMPAT, RT_TABLE_COMPAT)
+        self.assertEqual(len(newroute_parser(msg, table=RT_TABLE_COMPAT)), 1)
+        self.assertEqual(newroute_parser(msg, table=1000), [])
+
+
+class RouteManyTest(TestCase):
+    """Requests are validated before anything is sent"""
+
+    def test_bad_route_sends_nothing(self):
+        routes = [
+            {"dst": f"198.51.100.{i}", "dst_prefixlen": 32} for i in range(79)
+        ]
+        routes.append({"dst": "198.51.100.300", "dst_prefixlen": 32})
+        with patch("netlinklib.core._nll_transact_batch") as send:
+            with self.assertRaisesRegex(ValueError, "route #79:"):
+                nll_route_add_many(routes, socket=object())  # type: ignore
+        send.assert_not_called()
+
+    def test_socket_per_route(self):
+        with patch("netlinklib.core._nll_transact_batch") as send:
+            with self.assertRaisesRegex(TypeError, "route #1: `socket`"):
+                nll_route_add_many(
+                    [
+                        {"dst": "198.51.100.1"},
+                        {"dst": "198.51.100.2", "socket": None},
+                    ],
+                    socket=object(),  # type: ignore
+                )
+        send.assert_not_called()